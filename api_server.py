@@ -3,20 +3,67 @@ Simple API Server - Personal Keys Only
 Each user gets their own unique key tied to their Discord ID
 """
 
-from flask import Flask, request, jsonify
+# Monkey-patch before anything imports sqlite3/requests so their socket and
+# select calls cooperate with gevent greenlets (no-op if gevent isn't installed)
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+import orjson
 import sqlite3
 import hashlib
+import logging
 import os
+import atexit
+import queue
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from contextlib import contextmanager
 from datetime import datetime
-from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+class ORJSONProvider(JSONProvider):
+    """Route jsonify/request.get_json through orjson instead of stdlib json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
+# Compress the Lua/JSON bodies - the loader script is multi-KB of text and
+# compresses ~4x, and Roblox's HttpGet accepts gzip
+app.config['COMPRESS_MIMETYPES'] = ['text/plain', 'application/json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+# Keep-alive session for Discord webhook posts - avoids a fresh TCP+TLS
+# handshake on every tamper alert
+_DISCORD_SESSION = requests.Session()
+_DISCORD_SESSION.mount(
+    'https://',
+    HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                max_retries=Retry(total=2, backoff_factor=0.1))
+)
+
 # =============================================
 # CONFIGURATION
 # =============================================
@@ -27,6 +74,24 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "change-this-in-production")
     DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+
+# =============================================
+# LOGGING
+# =============================================
+# Handler-path logging goes through a QueueHandler so formatting and stdout
+# writes happen on the listener's background thread, not in the request path.
+# Startup banners stay as plain print() - they run once.
+log = logging.getLogger("api")
+log.setLevel(logging.INFO if Config.DEBUG else logging.WARNING)
+
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+log.addHandler(QueueHandler(_log_queue))
 
 def print_config():
     print("=" * 50)
@@ -40,11 +105,36 @@ def print_config():
 # =============================================
 # DATABASE
 # =============================================
+# Hot-path SQL hoisted to module constants: the same interned string object is
+# passed to execute() every time, so sqlite3's per-connection statement cache
+# hits without re-hashing a freshly built literal.
+SQL_VERIFY_LOOKUP = (
+    "SELECT u.discord_id, u.username, u.is_active, u.expiry_date, u.hwid, b.reason "
+    "FROM users u LEFT JOIN blacklist b ON b.hwid = ? WHERE u.personal_key = ?"
+)
+SQL_SELECT_BLACKLIST_REASON = "SELECT reason FROM blacklist WHERE hwid = ?"
+SQL_SELECT_BLACKLIST_HWIDS = "SELECT hwid FROM blacklist"
+SQL_UPDATE_USER_HWID = "UPDATE users SET hwid = ? WHERE discord_id = ?"
+SQL_INSERT_ACTIVITY = "INSERT INTO activity_logs (discord_id, hwid, action, details, timestamp) VALUES (?, ?, ?, ?, ?)"
+SQL_SELECT_SCRIPT_KEY = "SELECT 1 FROM scripts WHERE script_key = ?"
+
+def _apply_pragmas(conn):
+    """Per-connection SQLite tuning. journal_mode=WAL persists in the DB file,
+    the rest must be re-applied on every new connection."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=10000")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    conn.execute("PRAGMA foreign_keys=ON")
+
 def init_database():
-    conn = sqlite3.connect(Config.DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+    conn = sqlite3.connect(Config.DATABASE_PATH, timeout=30)
+    _apply_pragmas(conn)
+
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             discord_id TEXT UNIQUE NOT NULL,
@@ -58,7 +148,7 @@ def init_database():
         )
     """)
     
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS blacklist (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             discord_id TEXT,
@@ -69,7 +159,7 @@ def init_database():
         )
     """)
     
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS activity_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             discord_id TEXT,
@@ -80,61 +170,284 @@ def init_database():
         )
     """)
     
+    # Hot lookup paths: admin endpoints filter/sort on these. discord_id and
+    # personal_key are already auto-indexed by their UNIQUE constraints.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_hwid ON users(hwid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_ts ON activity_logs(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_discord ON activity_logs(discord_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_expiry ON users(expiry_date) WHERE is_active = 1")
+    conn.execute("ANALYZE")
+
     conn.commit()
+    _blacklist_set(conn)  # warm the in-memory blacklist before serving
     conn.close()
+    _start_activity_writer()
     print("✅ Database initialized")
 
+class SQLiteConnectionPool:
+    """Pool of pre-opened SQLite connections shared by all request handlers.
+
+    Opening a fresh connection per request forces SQLite to re-read the file
+    header, rebuild its page cache and re-apply pragmas every time. Keeping a
+    small pool of long-lived connections avoids all of that.
+    """
+
+    def __init__(self, db_path, size=10):
+        self.db_path = db_path
+        self._pool = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._open())
+
+    def _open(self):
+        # Autocommit: SELECTs don't open implicit transactions, single-statement
+        # writes commit themselves, and multi-statement writes use explicit
+        # BEGIN IMMEDIATE ... COMMIT
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                               cached_statements=512, isolation_level=None)
+        _apply_pragmas(conn)
+        return conn
+
+    def acquire(self):
+        return self._pool.get()
+
+    def release(self, conn):
+        self._pool.put(conn)
+
+_db_pool = None
+
+def _get_pool():
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = SQLiteConnectionPool(Config.DATABASE_PATH, size=Config.DB_POOL_SIZE)
+    return _db_pool
+
+# In-memory TTL caches for the hot read paths. The same small set of keys
+# and HWIDs is checked on every script execution, so a short TTL turns most
+# verify calls into dict lookups instead of SQLite queries.
+# USER_CACHE caches is_active, and invalidation from the admin endpoints only
+# reaches the worker that handled the POST - so under multiple gunicorn
+# workers a revoked user stays valid until the entry expires. Keep the TTL
+# short (matching BLACKLIST_CACHE) to bound that lag at 60s.
+USER_CACHE = TTLCache(maxsize=1024, ttl=60)          # personal_key -> user row
+BLACKLIST_CACHE = TTLCache(maxsize=100_000, ttl=60)  # hwid -> reason or None
+STATS_CACHE = TTLCache(maxsize=1, ttl=30)            # 'stats' -> /admin/stats body
+
+_CACHE_MISS = object()
+
+def get_user_and_blacklist(conn, personal_key, hwid):
+    """verify_key's combined lookup: (user row, blacklist reason).
+
+    On a user-cache hit this costs zero queries (blacklist goes through the
+    in-memory set); on a miss, one LEFT JOIN fetches the user and this HWID's
+    blacklist entry in a single round-trip and primes both caches.
+    """
+    user = USER_CACHE.get(personal_key, _CACHE_MISS)
+    if user is not _CACHE_MISS:
+        reason = is_blacklisted(conn, hwid) if hwid else None
+        return user, reason
+
+    row = conn.execute(SQL_VERIFY_LOOKUP, (hwid, personal_key)).fetchone()
+    if row is None:
+        USER_CACHE[personal_key] = None
+        return None, None
+
+    user, reason = row[:5], row[5]
+    USER_CACHE[personal_key] = user
+    if hwid:
+        BLACKLIST_CACHE[hwid] = reason
+    return user, reason
+
+# Full set of blacklisted HWIDs, refreshed at most once per minute. 99% of
+# verify calls are for clean HWIDs, and "definitely not blacklisted" is a set
+# membership test - no SQLite query, no per-HWID cache entry.
+_BLACKLIST_SET = set()
+_BLACKLIST_SET_LOADED_AT = 0.0
+_BLACKLIST_SET_TTL = 60
+
+def _blacklist_set(conn):
+    global _BLACKLIST_SET, _BLACKLIST_SET_LOADED_AT
+    now = time.monotonic()
+    if now - _BLACKLIST_SET_LOADED_AT > _BLACKLIST_SET_TTL:
+        _BLACKLIST_SET = {row[0] for row in conn.execute(SQL_SELECT_BLACKLIST_HWIDS)}
+        _BLACKLIST_SET_LOADED_AT = now
+    return _BLACKLIST_SET
+
+def is_blacklisted(conn, hwid):
+    """Return the blacklist reason for an HWID, or None. Cached with TTL."""
+    if hwid not in _blacklist_set(conn):
+        return None
+    reason = BLACKLIST_CACHE.get(hwid, _CACHE_MISS)
+    if reason is _CACHE_MISS:
+        row = conn.execute(SQL_SELECT_BLACKLIST_REASON, (hwid,)).fetchone()
+        reason = row[0] if row else None
+        BLACKLIST_CACHE[hwid] = reason
+    return reason
+
+@lru_cache(maxsize=4096)
+def _parse_expiry(expiry_date):
+    """Memoized ISO-8601 parse - the same few expiry strings recur on every
+    verify call, so each distinct value is parsed once."""
+    return datetime.fromisoformat(expiry_date)
+
+def invalidate_user_cache(discord_id=None, personal_key=None):
+    if personal_key is not None:
+        USER_CACHE.pop(personal_key, None)
+    if discord_id is not None:
+        stale = [k for k, v in USER_CACHE.items() if v and v[0] == discord_id]
+        for key in stale:
+            USER_CACHE.pop(key, None)
+
+@contextmanager
 def get_db():
-    return sqlite3.connect(Config.DATABASE_PATH)
-
-def log_request(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        print(f"📡 {request.method} {request.path} from {request.remote_addr}")
-        return f(*args, **kwargs)
-    return decorated_function
-
-def log_activity(discord_id=None, hwid=None, action="", details=""):
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Never return a connection to the pool mid-transaction
+        if conn.in_transaction:
+            conn.rollback()
+        pool.release(conn)
+
+# Request logging used to be a per-route decorator; a single before_request
+# hook (only registered at all when DEBUG is on) keeps production dispatch free
+# of the extra frame per request.
+if Config.DEBUG:
+    @app.before_request
+    def _log_request():
+        log.info("📡 %s %s from %s", request.method, request.path, request.remote_addr)
+
+# Activity logs are write-only telemetry - no reason to pay a write lock and
+# fsync on the request path for each row. Entries are queued and a background
+# thread flushes them in batches inside a single transaction.
+_ACTIVITY_Q = queue.Queue()
+_ACTIVITY_BATCH_SIZE = 100
+_ACTIVITY_FLUSH_INTERVAL = 0.1
+_activity_thread = None
+
+def _drain_activity_queue(limit=_ACTIVITY_BATCH_SIZE):
+    rows = []
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO activity_logs (discord_id, hwid, action, details) VALUES (?, ?, ?, ?)",
-            (discord_id, hwid, action, details)
+        rows.append(_ACTIVITY_Q.get(timeout=_ACTIVITY_FLUSH_INTERVAL))
+        while len(rows) < limit:
+            rows.append(_ACTIVITY_Q.get_nowait())
+    except queue.Empty:
+        pass
+    return rows
+
+def _flush_activity_rows(conn, rows):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            SQL_INSERT_ACTIVITY,
+            rows
         )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"❌ Failed to log activity: {e}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _activity_writer():
+    conn = sqlite3.connect(Config.DATABASE_PATH, timeout=30, check_same_thread=False,
+                           isolation_level=None)
+    _apply_pragmas(conn)
+    while True:
+        rows = _drain_activity_queue()
+        if not rows:
+            continue
+        try:
+            _flush_activity_rows(conn, rows)
+        except Exception as e:
+            log.error("❌ Failed to flush activity logs: %s", e)
+
+def _start_activity_writer():
+    global _activity_thread
+    if _activity_thread is None or not _activity_thread.is_alive():
+        _activity_thread = threading.Thread(target=_activity_writer, daemon=True)
+        _activity_thread.start()
+
+@atexit.register
+def _flush_activity_on_exit():
+    rows = []
+    try:
+        while True:
+            rows.append(_ACTIVITY_Q.get_nowait())
+    except queue.Empty:
+        pass
+    if rows:
+        try:
+            conn = sqlite3.connect(Config.DATABASE_PATH, isolation_level=None)
+            _flush_activity_rows(conn, rows)
+            conn.close()
+        except Exception as e:
+            log.error("❌ Failed to flush activity logs on exit: %s", e)
+
+def log_activity(discord_id=None, hwid=None, action="", details=""):
+    _start_activity_writer()
+    _ACTIVITY_Q.put_nowait(
+        (discord_id, hwid, action, details, datetime.utcnow().isoformat())
+    )
 
 # =============================================
 # ROUTES
 # =============================================
+# Static payloads serialized once at import time
+_INDEX_BODY = orjson.dumps({
+    'service': 'Bedwars ESP API',
+    'status': 'online',
+    'version': '3.0.1 - Fixed Edition',
+    'endpoints': {
+        'health': 'GET /health',
+        'verify_key': 'POST /verify-key',
+        'loader': 'GET /v3/files/loaders/esp.lua',
+        'esp_script': 'GET /v3/files/scripts/esp-main.lua',
+        'stats': 'GET /admin/stats'
+    }
+})
+
+_HEALTH_TEMPLATE = orjson.dumps({
+    'status': 'healthy',
+    'timestamp': '{TS}'
+})
+
 @app.route('/', methods=['GET'])
 def index():
-    return jsonify({
-        'service': 'Bedwars ESP API',
-        'status': 'online',
-        'version': '3.0.1 - Fixed Edition',
-        'endpoints': {
-            'health': 'GET /health',
-            'verify_key': 'POST /verify-key',
-            'loader': 'GET /v3/files/loaders/esp.lua',
-            'esp_script': 'GET /v3/files/scripts/esp-main.lua',
-            'stats': 'GET /admin/stats'
-        }
-    })
+    return Response(_INDEX_BODY, mimetype='application/json')
 
 @app.route('/health', methods=['GET'])
-@log_request
 def health_check():
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
-    })
+    body = _HEALTH_TEMPLATE.replace(b'{TS}', datetime.now().isoformat().encode())
+    return Response(body, mimetype='application/json')
+
+def _fast_static_wsgi(wsgi_app):
+    """Serve GET / and GET /health straight from WSGI, skipping Flask's
+    request-context setup and view dispatch. Everything else (other paths,
+    other methods) falls through to the Flask app unchanged."""
+    def middleware(environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'GET':
+            path = environ.get('PATH_INFO')
+            if path == '/':
+                body = _INDEX_BODY
+            elif path == '/health':
+                body = _HEALTH_TEMPLATE.replace(b'{TS}', datetime.now().isoformat().encode())
+            else:
+                body = None
+            if body is not None:
+                start_response('200 OK', [
+                    ('Content-Type', 'application/json'),
+                    ('Content-Length', str(len(body)))
+                ])
+                return [body]
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = _fast_static_wsgi(app.wsgi_app)
 
 @app.route('/verify-key', methods=['POST'])
-@log_request
 def verify_key():
     """Verify personal key and check blacklist"""
     try:
@@ -146,81 +459,62 @@ def verify_key():
         personal_key = data['script_key']
         hwid = data.get('hwid')
         
-        print(f"🔐 Verifying key: {personal_key[:16]}... with HWID: {hwid[:16] if hwid else 'None'}...")
-        
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Find user by their personal key
-        cursor.execute(
-            "SELECT discord_id, username, is_active, expiry_date, hwid FROM users WHERE personal_key = ?",
-            (personal_key,)
-        )
-        user = cursor.fetchone()
-        
-        if not user:
-            conn.close()
-            print(f"❌ Invalid key: {personal_key[:16]}...")
-            log_activity(hwid=hwid, action="INVALID_KEY", details=f"Key: {personal_key[:16]}...")
-            return jsonify({'valid': False, 'error': 'Invalid personal key'}), 403
-        
-        discord_id, username, is_active, expiry_date, registered_hwid = user
-        
-        print(f"✅ Found user: {username} (Discord ID: {discord_id})")
-        
-        # Check if active
-        if not is_active:
-            conn.close()
-            print(f"❌ User {username} is inactive")
-            log_activity(discord_id=discord_id, hwid=hwid, action="INACTIVE_USER", details="User is deactivated")
-            return jsonify({'valid': False, 'error': 'Access revoked'}), 403
-        
-        # Check if expired
-        if expiry_date:
-            expiry = datetime.fromisoformat(expiry_date)
-            if expiry < datetime.now():
-                conn.close()
-                print(f"❌ User {username} subscription expired on {expiry_date}")
-                log_activity(discord_id=discord_id, hwid=hwid, action="EXPIRED_USER", details="Subscription expired")
-                return jsonify({'valid': False, 'error': 'Subscription expired'}), 403
-        
-        # Check if HWID is blacklisted
-        if hwid:
-            cursor.execute("SELECT reason FROM blacklist WHERE hwid = ?", (hwid,))
-            blacklist_result = cursor.fetchone()
-            
-            if blacklist_result:
-                conn.close()
-                print(f"🚫 HWID {hwid[:16]}... is blacklisted")
-                log_activity(discord_id=discord_id, hwid=hwid, action="BLACKLIST_ATTEMPT", details="HWID is blacklisted")
-                return jsonify({
-                    'valid': False,
-                    'blacklisted': True,
-                    'reason': blacklist_result[0]
-                }), 403
-            
-            # Register or update HWID
-            if not registered_hwid:
-                print(f"📝 Registering HWID for {username}: {hwid[:16]}...")
-                cursor.execute(
-                    "UPDATE users SET hwid = ? WHERE discord_id = ?",
-                    (hwid, discord_id)
-                )
-                conn.commit()
-                log_activity(discord_id=discord_id, hwid=hwid, action="HWID_REGISTERED", details="First time execution")
-            elif registered_hwid != hwid:
-                # HWID changed - potential HWID reset or new device
-                print(f"⚠️ HWID changed for {username}: {registered_hwid[:16]}... -> {hwid[:16]}...")
-                log_activity(discord_id=discord_id, hwid=hwid, action="HWID_CHANGED", details=f"Old: {registered_hwid[:16]}...")
-                cursor.execute(
-                    "UPDATE users SET hwid = ? WHERE discord_id = ?",
-                    (hwid, discord_id)
-                )
-                conn.commit()
-        
-        conn.close()
-        
-        print(f"✅ Key verified successfully for {username}")
+        log.info("🔐 Verifying key: %s... with HWID: %s...", personal_key[:16], hwid[:16] if hwid else 'None')
+        
+        with get_db() as conn:
+            # User row + blacklist reason in one lookup (cached)
+            user, blacklist_reason = get_user_and_blacklist(conn, personal_key, hwid)
+
+            if not user:
+                log.info("❌ Invalid key: %s...", personal_key[:16])
+                log_activity(hwid=hwid, action="INVALID_KEY", details=f"Key: {personal_key[:16]}...")
+                return jsonify({'valid': False, 'error': 'Invalid personal key'}), 403
+
+            discord_id, username, is_active, expiry_date, registered_hwid = user
+
+            log.info("✅ Found user: %s (Discord ID: %s)", username, discord_id)
+
+            # Check if active
+            if not is_active:
+                log.info("❌ User %s is inactive", username)
+                log_activity(discord_id=discord_id, hwid=hwid, action="INACTIVE_USER", details="User is deactivated")
+                return jsonify({'valid': False, 'error': 'Access revoked'}), 403
+
+            # Check if expired
+            if expiry_date:
+                expiry = _parse_expiry(expiry_date)
+                if expiry < datetime.now():
+                    log.info("❌ User %s subscription expired on %s", username, expiry_date)
+                    log_activity(discord_id=discord_id, hwid=hwid, action="EXPIRED_USER", details="Subscription expired")
+                    return jsonify({'valid': False, 'error': 'Subscription expired'}), 403
+
+            # Check if HWID is blacklisted (cached)
+            if hwid:
+                if blacklist_reason is not None:
+                    log.warning("🚫 HWID %s... is blacklisted", hwid[:16])
+                    log_activity(discord_id=discord_id, hwid=hwid, action="BLACKLIST_ATTEMPT", details="HWID is blacklisted")
+                    return jsonify({
+                        'valid': False,
+                        'blacklisted': True,
+                        'reason': blacklist_reason
+                    }), 403
+
+                # Register or update HWID
+                if not registered_hwid:
+                    log.info("📝 Registering HWID for %s: %s...", username, hwid[:16])
+                    conn.execute(SQL_UPDATE_USER_HWID, (hwid, discord_id))
+                    log_activity(discord_id=discord_id, hwid=hwid, action="HWID_REGISTERED", details="First time execution")
+                elif registered_hwid != hwid:
+                    # HWID changed - potential HWID reset or new device
+                    log.warning("⚠️ HWID changed for %s: %s... -> %s...", username, registered_hwid[:16], hwid[:16])
+                    log_activity(discord_id=discord_id, hwid=hwid, action="HWID_CHANGED", details=f"Old: {registered_hwid[:16]}...")
+                    conn.execute(SQL_UPDATE_USER_HWID, (hwid, discord_id))
+
+                if registered_hwid != hwid:
+                    # Keep the cache in step with the HWID we just stored
+                    USER_CACHE[personal_key] = (discord_id, username, is_active, expiry_date, hwid)
+
+        log.info("✅ Key verified successfully for %s", username)
         log_activity(discord_id=discord_id, hwid=hwid, action="KEY_VERIFIED", details=f"User: {username}")
         
         return jsonify({
@@ -231,22 +525,13 @@ def verify_key():
         })
         
     except Exception as e:
-        print(f"❌ Error verifying key: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error verifying key: %s", e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/v3/files/loaders/esp.lua', methods=['GET'])
-@log_request
-def get_esp_loader():
-    """Return the ESP loader script"""
-    try:
-        # Get the base URL (ensure HTTPS for Render)
-        api_url = request.host_url.rstrip('/')
-        if 'render.com' in api_url:
-            api_url = api_url.replace('http://', 'https://')
-        
-        esp_template = '''-- Bedwars ESP Loader - Updated Edition
+# The loader Lua only varies by the API base URL, so it is built once per
+# host seen and reused. __API_URL__ is substituted rather than str.format
+# because the Lua source itself contains braces.
+_ESP_LOADER_TEMPLATE = '''-- Bedwars ESP Loader - Updated Edition
 -- Each user has their own personal key
 
 local HttpService = game:GetService("HttpService")
@@ -260,7 +545,7 @@ if not scriptkey then
 end
 
 local PERSONAL_KEY = scriptkey
-local API_URL = "''' + api_url + '''"
+local API_URL = "__API_URL__"
 local HWID = game:GetService("RbxAnalyticsService"):GetClientId()
 
 print("🔐 Verifying your personal key...")
@@ -335,76 +620,140 @@ if not success then
     LocalPlayer:Kick("❌ Failed to load ESP!\\n\\n" .. tostring(err))
 end
 '''
-        
-        return esp_template, 200, {'Content-Type': 'text/plain'}
-        
-    except Exception as e:
-        print(f"❌ Error serving ESP loader: {e}")
-        return f"-- Error: {str(e)}", 500, {'Content-Type': 'text/plain'}
 
-@app.route('/v3/files/scripts/esp-main.lua', methods=['GET'])
-@log_request
-def get_esp_main():
-    """Return the main ESP script"""
-    try:
-        esp_main_path = os.path.join(os.path.dirname(__file__), 'esp-main.lua')
-        
-        if os.path.exists(esp_main_path):
-            with open(esp_main_path, 'r') as f:
-                return f.read(), 200, {'Content-Type': 'text/plain'}
-        else:
-            return '''-- Bedwars ESP Main Script
+@lru_cache(maxsize=32)
+def _etag_for(body):
+    return hashlib.blake2b(body.encode(), digest_size=8).hexdigest()
+
+def _lua_response(body, max_age=3600):
+    """text/plain response with ETag/If-None-Match handling. The bodies here
+    are cached module-level strings, so the ETag is computed once per body."""
+    etag = _etag_for(body)
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    return Response(body, mimetype='text/plain', headers={
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}'
+    })
+
+@lru_cache(maxsize=4)
+def _render_esp_loader(host_url):
+    # Ensure HTTPS for Render
+    api_url = host_url.rstrip('/')
+    if 'render.com' in api_url:
+        api_url = api_url.replace('http://', 'https://')
+    return _ESP_LOADER_TEMPLATE.replace('__API_URL__', api_url)
+
+@app.route('/v3/files/loaders/esp.lua', methods=['GET'])
+def get_esp_loader():
+    """Return the ESP loader script"""
+    return _lua_response(_render_esp_loader(request.host_url))
+
+_ESP_MAIN_PATH = os.path.join(os.path.dirname(__file__), 'esp-main.lua')
+_ESP_MAIN_CACHE = {'mtime': None, 'body': None}
+
+_ESP_MAIN_FALLBACK = '''-- Bedwars ESP Main Script
 print("✅ ESP Loaded!")
 print("📍 HWID: " .. game:GetService("RbxAnalyticsService"):GetClientId():sub(1, 16) .. "...")
 print("🎮 Press INSERT to toggle ESP")
 
 -- Your full ESP code goes here
-''', 200, {'Content-Type': 'text/plain'}
-        
+'''
+
+# Warm the cache at import so the first request doesn't pay the file read
+try:
+    _st = os.stat(_ESP_MAIN_PATH)
+    with open(_ESP_MAIN_PATH, 'r') as _f:
+        _ESP_MAIN_CACHE['body'] = _f.read()
+    _ESP_MAIN_CACHE['mtime'] = _st.st_mtime
+except OSError:
+    pass
+
+@app.route('/v3/files/scripts/esp-main.lua', methods=['GET'])
+def get_esp_main():
+    """Return the main ESP script"""
+    try:
+        # One stat per request; only re-read the file when it actually changed
+        st = os.stat(_ESP_MAIN_PATH)
+        if st.st_mtime != _ESP_MAIN_CACHE['mtime']:
+            with open(_ESP_MAIN_PATH, 'r') as f:
+                _ESP_MAIN_CACHE['body'] = f.read()
+            _ESP_MAIN_CACHE['mtime'] = st.st_mtime
+        return _lua_response(_ESP_MAIN_CACHE['body'], max_age=300)
+    except FileNotFoundError:
+        return _lua_response(_ESP_MAIN_FALLBACK, max_age=300)
     except Exception as e:
-        print(f"❌ Error serving ESP main: {e}")
+        log.error("❌ Error serving ESP main: %s", e)
         return f"-- Error: {str(e)}", 500, {'Content-Type': 'text/plain'}
 
+def _forward_alert(data):
+    try:
+        _DISCORD_SESSION.post(
+            Config.DISCORD_WEBHOOK_URL,
+            data=orjson.dumps(data),
+            headers={'Content-Type': 'application/json'},
+            timeout=10
+        )
+        log.info("✅ Alert forwarded to Discord")
+    except Exception as e:
+        log.error("❌ Error forwarding alert: %s", e)
+
+SCRIPT_KEY_CACHE = TTLCache(maxsize=1024, ttl=300)  # script_key -> exists?
+
+def _script_key_exists(script_key):
+    exists = SCRIPT_KEY_CACHE.get(script_key)
+    if exists is None:
+        try:
+            with get_db() as conn:
+                exists = conn.execute(SQL_SELECT_SCRIPT_KEY, (script_key,)).fetchone() is not None
+        except sqlite3.OperationalError:
+            # scripts table is created by the bot; may not exist yet
+            exists = False
+        SCRIPT_KEY_CACHE[script_key] = exists
+    return exists
+
+@app.route('/raw/<script_key>', methods=['GET'])
+def get_raw_script(script_key):
+    """Serve the loader for a script key generated by the bot.
+
+    The bot's /genscript command hands out {API_URL}/raw/<key> URLs; the key
+    is validated against the scripts table (cached), then the pre-rendered
+    loader body is returned.
+    """
+    if not _script_key_exists(script_key):
+        return '-- Unknown script key', 404, {'Content-Type': 'text/plain'}
+
+    return _lua_response(_render_esp_loader(request.host_url), max_age=300)
+
 @app.route('/tamper-alert', methods=['POST'])
-@log_request
 def tamper_alert():
     """Receive tamper alerts"""
     try:
         data = request.get_json()
-        
+
         if Config.DISCORD_WEBHOOK_URL:
-            try:
-                import requests
-                requests.post(
-                    Config.DISCORD_WEBHOOK_URL,
-                    json=data,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=10
-                )
-                print("✅ Alert forwarded to Discord")
-            except Exception as e:
-                print(f"❌ Error forwarding alert: {e}")
-        
+            # Fire-and-forget: don't make the client wait up to 10s on Discord
+            threading.Thread(target=_forward_alert, args=(data,), daemon=True).start()
+
         return jsonify({'success': True})
-        
+
     except Exception as e:
-        print(f"❌ Error handling alert: {e}")
+        log.error("❌ Error handling alert: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # =============================================
 # ADMIN ENDPOINTS
 # =============================================
 @app.route('/admin/whitelist-user', methods=['POST'])
-@log_request
 def admin_whitelist_user():
     """Whitelist a user (called from Discord bot)"""
     try:
         data = request.get_json()
         
-        print(f"📥 Received whitelist request: {data}")
+        log.info("📥 Received whitelist request: %s", data)
         
         if not data or 'discord_id' not in data or 'personal_key' not in data:
-            print("❌ Missing required fields")
+            log.info("❌ Missing required fields")
             return jsonify({'error': 'discord_id and personal_key required'}), 400
         
         discord_id = data['discord_id']
@@ -412,50 +761,39 @@ def admin_whitelist_user():
         username = data.get('username', 'Unknown')
         expiry_date = data.get('expiry_date')  # NEW: Accept expiry date
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        try:
-            # Check if user already exists
-            cursor.execute("SELECT id FROM users WHERE discord_id = ?", (discord_id,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                print(f"⚠️ User {username} already exists, updating...")
-                # Update existing user
-                cursor.execute(
-                    "UPDATE users SET personal_key = ?, username = ?, expiry_date = ?, is_active = 1 WHERE discord_id = ?",
-                    (personal_key, username, expiry_date, discord_id)
-                )
-            else:
-                print(f"➕ Adding new user {username}...")
-                # Insert new user
-                cursor.execute(
-                    "INSERT INTO users (discord_id, username, personal_key, expiry_date, is_active) VALUES (?, ?, ?, ?, 1)",
+        with get_db() as conn:
+            try:
+                # Single upsert instead of SELECT-then-branch
+                conn.execute(
+                    """
+                    INSERT INTO users (discord_id, username, personal_key, expiry_date, is_active)
+                    VALUES (?, ?, ?, ?, 1)
+                    ON CONFLICT(discord_id) DO UPDATE SET
+                        personal_key = excluded.personal_key,
+                        username = excluded.username,
+                        expiry_date = excluded.expiry_date,
+                        is_active = 1
+                    """,
                     (discord_id, username, personal_key, expiry_date)
                 )
-            
-            conn.commit()
-            
-            print(f"✅ Successfully whitelisted {username} with key {personal_key}")
-            log_activity(discord_id=discord_id, action="USER_WHITELISTED", details=f"User: {username}")
-            
-            return jsonify({'success': True, 'message': f'User {username} whitelisted successfully'})
-            
-        except sqlite3.IntegrityError as e:
-            print(f"❌ Database integrity error: {e}")
-            return jsonify({'error': f'Database error: {str(e)}'}), 409
-        finally:
-            conn.close()
-        
+            except sqlite3.IntegrityError as e:
+                # Can still fire if personal_key collides with another user
+                log.error("❌ Database integrity error: %s", e)
+                return jsonify({'error': f'Database error: {str(e)}'}), 409
+
+        invalidate_user_cache(discord_id=discord_id, personal_key=personal_key)
+        STATS_CACHE.pop('stats', None)
+
+        log.info("✅ Successfully whitelisted %s with key %s", username, personal_key)
+        log_activity(discord_id=discord_id, action="USER_WHITELISTED", details=f"User: {username}")
+
+        return jsonify({'success': True, 'message': f'User {username} whitelisted successfully'})
+
     except Exception as e:
-        print(f"❌ Error whitelisting user: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error whitelisting user: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/remove-whitelist', methods=['POST'])
-@log_request
 def admin_remove_whitelist():
     """Remove user from whitelist"""
     try:
@@ -466,26 +804,24 @@ def admin_remove_whitelist():
         
         discord_id = data['discord_id']
         
-        print(f"🗑️ Removing whitelist for Discord ID: {discord_id}")
-        
-        conn = get_db()
-        cursor = conn.cursor()
+        log.info("🗑️ Removing whitelist for Discord ID: %s", discord_id)
         
-        cursor.execute("UPDATE users SET is_active = 0 WHERE discord_id = ?", (discord_id,))
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Successfully removed whitelist for {discord_id}")
+        with get_db() as conn:
+            conn.execute("UPDATE users SET is_active = 0 WHERE discord_id = ?", (discord_id,))
+
+        invalidate_user_cache(discord_id=discord_id)
+        STATS_CACHE.pop('stats', None)
+
+        log.info("✅ Successfully removed whitelist for %s", discord_id)
         log_activity(discord_id=discord_id, action="USER_REMOVED", details="Removed from whitelist")
         
         return jsonify({'success': True})
         
     except Exception as e:
-        print(f"❌ Error removing user: {e}")
+        log.exception("❌ Error removing user: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/blacklist', methods=['POST'])
-@log_request
 def admin_blacklist():
     """Add HWID to blacklist"""
     try:
@@ -499,100 +835,107 @@ def admin_blacklist():
         blacklisted_by = data.get('blacklisted_by', 'system')
         discord_id = data.get('discord_id')
         
-        print(f"🚫 Blacklisting HWID: {hwid[:16]}... - Reason: {reason}")
-        
-        conn = get_db()
-        cursor = conn.cursor()
+        log.info("🚫 Blacklisting HWID: %s... - Reason: %s", hwid[:16], reason)
         
-        try:
-            cursor.execute(
-                "INSERT INTO blacklist (discord_id, hwid, reason, blacklisted_by) VALUES (?, ?, ?, ?)",
+        with get_db() as conn:
+            # Insert + deactivate atomically: one explicit transaction, one fsync
+            conn.execute("BEGIN IMMEDIATE")
+
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO blacklist (discord_id, hwid, reason, blacklisted_by) VALUES (?, ?, ?, ?)",
                 (discord_id, hwid, reason, blacklisted_by)
             )
-            
-            cursor.execute("UPDATE users SET is_active = 0 WHERE hwid = ?", (hwid,))
-            
-            conn.commit()
-            
-            log_activity(discord_id=discord_id, hwid=hwid, action="HWID_BLACKLISTED", details=reason)
-            
-            print(f"✅ Successfully blacklisted HWID: {hwid[:16]}...")
-            
-            return jsonify({'success': True})
-            
-        except sqlite3.IntegrityError:
-            print(f"⚠️ HWID {hwid[:16]}... already blacklisted")
-            return jsonify({'error': 'HWID already blacklisted'}), 409
-        finally:
-            conn.close()
-        
+
+            if inserted.rowcount == 0:
+                conn.execute("ROLLBACK")
+                log.info("⚠️ HWID %s... already blacklisted", hwid[:16])
+                return jsonify({'error': 'HWID already blacklisted'}), 409
+
+            conn.execute("UPDATE users SET is_active = 0 WHERE hwid = ?", (hwid,))
+
+            conn.execute("COMMIT")
+
+        _BLACKLIST_SET.add(hwid)
+        BLACKLIST_CACHE.pop(hwid, None)
+        invalidate_user_cache(discord_id=discord_id)
+        STATS_CACHE.pop('stats', None)
+
+        log_activity(discord_id=discord_id, hwid=hwid, action="HWID_BLACKLISTED", details=reason)
+
+        log.info("✅ Successfully blacklisted HWID: %s...", hwid[:16])
+
+        return jsonify({'success': True})
+
     except Exception as e:
-        print(f"❌ Error blacklisting: {e}")
+        log.exception("❌ Error blacklisting: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/stats', methods=['GET'])
-@log_request
 def admin_stats():
     """Get system statistics"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-        active_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM blacklist")
-        blacklisted = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users WHERE hwid IS NOT NULL")
-        with_hwid = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return jsonify({
-            'total_users': total_users,
-            'active_users': active_users,
-            'blacklisted': blacklisted,
-            'users_with_hwid': with_hwid
-        })
-        
+        stats = STATS_CACHE.get('stats')
+        if stats is None:
+            with get_db() as conn:
+                # One statement, one round-trip: the user counts share a scan
+                total_users, active_users, with_hwid, blacklisted = conn.execute("""
+                    SELECT
+                        COUNT(*),
+                        SUM(is_active = 1),
+                        SUM(hwid IS NOT NULL),
+                        (SELECT COUNT(*) FROM blacklist)
+                    FROM users
+                """).fetchone()
+
+            stats = {
+                'total_users': total_users,
+                'active_users': active_users or 0,
+                'blacklisted': blacklisted,
+                'users_with_hwid': with_hwid or 0
+            }
+            STATS_CACHE['stats'] = stats
+
+        return jsonify(stats)
+
     except Exception as e:
-        print(f"❌ Error getting stats: {e}")
+        log.exception("❌ Error getting stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/hwid-list', methods=['GET'])
-@log_request
 def admin_hwid_list():
     """Get list of all registered HWIDs"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT discord_id, username, hwid, created_at
-            FROM users
-            WHERE hwid IS NOT NULL
-            ORDER BY created_at DESC
-        """)
-        
-        hwids = []
-        for row in cursor.fetchall():
-            hwids.append({
-                'discord_id': row[0],
-                'username': row[1],
-                'hwid': row[2],
-                'registered': row[3]
-            })
-        
-        conn.close()
-        
-        return jsonify({'hwids': hwids, 'total': len(hwids)})
-        
+        def generate():
+            # Stream row by row instead of materializing the whole list:
+            # memory stays constant and the first byte goes out after one fetch
+            with get_db() as conn:
+                total = conn.execute("SELECT COUNT(*) FROM users WHERE hwid IS NOT NULL").fetchone()[0]
+
+                cursor = conn.execute("""
+                    SELECT discord_id, username, hwid, created_at
+                    FROM users
+                    WHERE hwid IS NOT NULL
+                    ORDER BY created_at DESC
+                """)
+
+                yield b'{"hwids":['
+                first = True
+                for discord_id, username, hwid, created_at in cursor:
+                    if not first:
+                        yield b','
+                    first = False
+                    yield orjson.dumps({
+                        'discord_id': discord_id,
+                        'username': username,
+                        'hwid': hwid,
+                        'registered': created_at
+                    })
+                yield b'],"total":%d}' % total
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
     except Exception as e:
-        print(f"❌ Error getting HWID list: {e}")
+        log.exception("❌ Error getting HWID list: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.errorhandler(404)
@@ -606,17 +949,23 @@ def internal_error(error):
 # =============================================
 # STARTUP
 # =============================================
+# Run at import so gunicorn workers get tables, indexes, the blacklist
+# warm-up and the activity writer too - not just the dev-server path below.
+# Idempotent: everything is CREATE ... IF NOT EXISTS.
+init_database()
+
 if __name__ == '__main__':
     print("=" * 50)
     print("Simple Bedwars ESP API v3.0.1")
     print("=" * 50)
     
     print_config()
-    init_database()
     
     print(f"✅ Server starting on http://{Config.HOST}:{Config.PORT}")
+    print("ℹ️  Production: gunicorn -c gunicorn_conf.py api_server:app")
     print("=" * 50)
-    
+
+    # Dev fallback only - Flask's server is single-threaded, use gunicorn in prod
     app.run(
         host=Config.HOST,
         port=Config.PORT,
@@ -3,14 +3,21 @@ Discord Bot with Environment Variables Support
 All configuration through .env file or environment variables
 """
 
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
 import sqlite3
-import hashlib
 import secrets
 import string
+import queue
+import atexit
+import hashlib
+import json
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import lru_cache, wraps
 import os
 from dotenv import load_dotenv
 
@@ -87,15 +94,56 @@ def print_config():
 # DATABASE SETUP
 # =============================================
 class Database:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size=4):
         self.db_path = db_path
         self.init_database()
-    
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
-    
+        # Small pool of long-lived connections - opening sqlite3 per call
+        # paid the open + page-cache warmup cost on every single command
+        self._pool = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._open())
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            check_same_thread=False,  # handlers run DB work on worker threads
+            isolation_level=None,     # autocommit; writes group with BEGIN IMMEDIATE
+            cached_statements=256     # keep every hot statement's bytecode compiled
+        )
+        # The API server shares this database: WAL lets bot writes overlap
+        # its readers, and NORMAL only fsyncs on checkpoints. busy_timeout
+        # covers the rare moment both processes want the write lock.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Touch the hot tables so each connection has the catalog and root
+        # B-tree pages resident before the first command arrives
+        for table in ("users", "keys", "scripts", "blacklist"):
+            try:
+                conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+            except sqlite3.OperationalError:
+                pass  # first connection runs before init_database creates tables
+        return conn
+
+    @contextmanager
+    def acquire(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Never return a connection to the pool mid-transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
     def init_database(self):
-        conn = self.get_connection()
+        conn = self._open()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -167,41 +215,161 @@ class Database:
             )
         """)
         
-        conn.commit()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+
+        # /stats counts active users on every call; the partial index turns
+        # that into an index-only scan over just the active rows. key_code
+        # and discord_id already get automatic indexes from UNIQUE.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_active ON users(is_active) WHERE is_active = 1")
+        cursor.execute("ANALYZE")
+
         conn.close()
         print("✅ Database initialized")
 
+# =============================================
+# SQL STATEMENTS
+# =============================================
+# Hoisted to module level so every call reuses the same interned string and
+# hits sqlite3's per-connection prepared-statement cache.
+
+SQL_SELECT_IS_ACTIVE = "SELECT is_active FROM users WHERE discord_id = ?"
+SQL_SELECT_USER = "SELECT * FROM users WHERE discord_id = ?"
+SQL_SELECT_SCRIPTS = "SELECT name, description, script_url, script_key, version FROM scripts"
+SQL_SELECT_HWID_RESET = "SELECT hwid, last_reset FROM users WHERE discord_id = ?"
+SQL_INSERT_HWID_RESET = "INSERT INTO hwid_resets (discord_id, old_hwid) VALUES (?, ?)"
+SQL_CLEAR_HWID = "UPDATE users SET hwid = NULL, last_reset = ? WHERE discord_id = ?"
+SQL_SELECT_UNREDEEMED_KEY = "SELECT duration_days FROM keys WHERE key_code = ? AND is_redeemed = 0"
+SQL_UPSERT_USER_LICENSE = """
+    INSERT INTO users (discord_id, username, license_key, expiry_date, is_active)
+    VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT(discord_id) DO UPDATE SET
+        license_key = excluded.license_key,
+        expiry_date = excluded.expiry_date,
+        is_active = 1
+"""
+SQL_MARK_KEY_REDEEMED = "UPDATE keys SET is_redeemed = 1, redeemed_by = ?, redeemed_at = ? WHERE key_code = ? AND is_redeemed = 0"
+SQL_INSERT_ACTIVITY = "INSERT INTO activity_logs (discord_id, action, details, timestamp) VALUES (?, ?, ?, ?)"
+SQL_INSERT_KEY = "INSERT INTO keys (key_code, duration_days) VALUES (?, ?)"
+SQL_SELECT_STATS = """
+    SELECT
+        (SELECT COUNT(*) FROM users),
+        (SELECT COUNT(*) FROM users WHERE is_active = 1),
+        (SELECT COUNT(*) FROM blacklist)
+"""
+SQL_INSERT_SCRIPT = "INSERT OR IGNORE INTO scripts (name, script_key, script_url) VALUES (?, ?, ?)"
+SQL_SELECT_META = "SELECT value FROM meta WHERE key = ?"
+SQL_UPSERT_META = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
 # =============================================
 # UTILITY FUNCTIONS
 # =============================================
+_KEY_ALPHABET = string.ascii_uppercase + string.digits
+
 def generate_key(length=32):
-    characters = string.ascii_uppercase + string.digits
-    key = ''.join(secrets.choice(characters) for _ in range(length))
+    # One entropy request per key instead of one secrets.choice per
+    # character. The byte-to-alphabet mapping keeps the uppercase+digits
+    # XXXXXXXX-XXXXXXXX-... format the redeem modal expects (it uppercases
+    # input), and a 32-char base-36 key still carries ~165 bits of entropy.
+    raw = secrets.token_bytes(length)
+    key = ''.join(_KEY_ALPHABET[b % len(_KEY_ALPHABET)] for b in raw)
     return '-'.join([key[i:i+8] for i in range(0, len(key), 8)])
 
-def hash_hwid(hwid):
-    return hashlib.sha256(hwid.encode()).hexdigest()
+# Activity rows buffer in memory and flush as one executemany batch - bursty
+# command usage costs one fsync per flush instead of one per action. The
+# timestamp is captured at enqueue time so buffering doesn't skew it.
+_ACTIVITY_BUFFER = deque()
+_ACTIVITY_BATCH_SIZE = 100
+_ACTIVITY_FLUSH_INTERVAL = 1.0
 
 def log_activity(db: Database, discord_id: str, action: str, details: str = ""):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO activity_logs (discord_id, action, details) VALUES (?, ?, ?)",
-        (discord_id, action, details)
-    )
-    conn.commit()
-    conn.close()
+    _ACTIVITY_BUFFER.append((discord_id, action, details, datetime.now().isoformat()))
+
+def _flush_activity_buffer():
+    while _ACTIVITY_BUFFER:
+        rows = [
+            _ACTIVITY_BUFFER.popleft()
+            for _ in range(min(len(_ACTIVITY_BUFFER), _ACTIVITY_BATCH_SIZE))
+        ]
+        try:
+            with db.acquire() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(SQL_INSERT_ACTIVITY, rows)
+                conn.execute("COMMIT")
+        except Exception:
+            # Put the batch back so the next flush retries it
+            _ACTIVITY_BUFFER.extendleft(reversed(rows))
+            raise
+
+async def _flush_activity_loop():
+    while True:
+        await asyncio.sleep(_ACTIVITY_FLUSH_INTERVAL)
+        if _ACTIVITY_BUFFER:
+            try:
+                await asyncio.to_thread(_flush_activity_buffer)
+            except Exception as e:
+                # Keep the loop alive - the rows were re-queued and a later
+                # flush (or the atexit hook) will retry them
+                print(f"❌ Failed to flush activity logs: {e}")
+
+@atexit.register
+def _flush_activity_on_exit():
+    _flush_activity_buffer()
+
+# Hot-path error replies, built once. The permission-denied branches run on
+# every non-buyer click of a public panel.
+_ERR_NOT_ADMIN = "❌ Admin only!"
+_ERR_NO_PERMISSION = "❌ You don't have permission to use this command!"
+_ERR_NEED_BUYER_PANEL = "❌ You need the Buyer role to use this panel!"
+_ERR_NEED_BUYER = "❌ You need the Buyer role!"
+
+async def _reply_err(interaction: discord.Interaction, message: str):
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+async def _safe_add_roles(member: discord.Member, role: discord.Role):
+    try:
+        await member.add_roles(role)
+    except Exception:
+        pass
+
+async def _safe_dm(user: discord.abc.Messageable, embed: discord.Embed):
+    try:
+        await user.send(embed=embed)
+    except Exception:
+        pass
 
 def is_admin(interaction: discord.Interaction) -> bool:
     if Config.ADMIN_ROLE_ID == 0:
         return interaction.user.guild_permissions.administrator
-    return (interaction.user.guild_permissions.administrator or 
-            any(role.id == Config.ADMIN_ROLE_ID for role in interaction.user.roles))
+    # get_role is a dict lookup, vs scanning the member's role list
+    return (interaction.user.guild_permissions.administrator or
+            interaction.user.get_role(Config.ADMIN_ROLE_ID) is not None)
 
 def has_buyer_role(interaction: discord.Interaction) -> bool:
     if Config.BUYER_ROLE_ID == 0:
         return True  # If not configured, allow everyone
-    return any(role.id == Config.BUYER_ROLE_ID for role in interaction.user.roles)
+    return interaction.user.get_role(Config.BUYER_ROLE_ID) is not None
+
+# Buyer role object per guild, so role-touching paths skip the cache scan on
+# every call. Invalidated by the role events below.
+_ROLE_CACHE = {}
+
+def get_buyer_role(guild: discord.Guild):
+    if Config.BUYER_ROLE_ID == 0 or guild is None:
+        return None
+    role = _ROLE_CACHE.get(guild.id)
+    if role is None:
+        role = guild.get_role(Config.BUYER_ROLE_ID)
+        if role:
+            _ROLE_CACHE[guild.id] = role
+    return role
 
 # =============================================
 # DISCORD BOT SETUP
@@ -213,6 +381,121 @@ intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 db = Database(Config.DATABASE_PATH)
 
+# One canonical guild reference for command registration and syncing
+_GUILD_OBJ = discord.Object(id=Config.GUILD_ID)
+
+# =============================================
+# BLOCKING DB HELPERS
+# =============================================
+# sqlite3 calls are synchronous and stall the whole event loop (heartbeats,
+# other users' interactions) while they run. Handlers call these plain
+# functions through asyncio.to_thread so the loop keeps ticking; each helper
+# uses a single connection for its whole operation.
+
+def _fetch_scripts_for(db: Database, discord_id: str):
+    """Return the script list for an active user, or None if not subscribed."""
+    with db.acquire() as conn:
+        user = conn.execute(SQL_SELECT_IS_ACTIVE, (discord_id,)).fetchone()
+
+        if not user or not user[0]:
+            return None
+
+        return conn.execute(SQL_SELECT_SCRIPTS).fetchall()
+
+def _reset_hwid(db: Database, discord_id: str):
+    """Reset a user's HWID. Returns ('no_hwid' | 'cooldown' | 'reset', days_left)."""
+    with db.acquire() as conn:
+        result = conn.execute(SQL_SELECT_HWID_RESET, (discord_id,)).fetchone()
+
+        if not result or not result[0]:
+            return 'no_hwid', None
+
+        hwid, last_reset = result
+
+        if last_reset:
+            days_since = (datetime.now() - datetime.fromisoformat(last_reset)).days
+            if days_since < Config.HWID_RESET_COOLDOWN_DAYS:
+                return 'cooldown', Config.HWID_RESET_COOLDOWN_DAYS - days_since
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(SQL_INSERT_HWID_RESET, (discord_id, hwid))
+        conn.execute(SQL_CLEAR_HWID, (datetime.now().isoformat(), discord_id))
+        conn.execute("COMMIT")
+        return 'reset', None
+
+def _fetch_user(db: Database, discord_id: str):
+    with db.acquire() as conn:
+        return conn.execute(SQL_SELECT_USER, (discord_id,)).fetchone()
+
+def _redeem_key(db: Database, discord_id: str, username: str, key_code: str):
+    """Redeem a key for a user. Returns (duration_days, expiry_date) or None."""
+    with db.acquire() as conn:
+        key_data = conn.execute(SQL_SELECT_UNREDEEMED_KEY, (key_code,)).fetchone()
+
+        if not key_data:
+            return None
+
+        duration_days = key_data[0]
+        expiry_date = (datetime.now() + timedelta(days=duration_days)).isoformat()
+
+        # Claim the key inside the transaction with the is_redeemed = 0
+        # guard: if two redeems race, only the first UPDATE matches a row
+        # and the loser bails before touching the user's license. The
+        # pre-transaction SELECT is just a fast path for the common
+        # invalid-key case.
+        conn.execute("BEGIN IMMEDIATE")
+        claimed = conn.execute(SQL_MARK_KEY_REDEEMED, (discord_id, datetime.now().isoformat(), key_code))
+        if claimed.rowcount == 0:
+            conn.execute("ROLLBACK")
+            return None
+        conn.execute(SQL_UPSERT_USER_LICENSE, (discord_id, username, key_code, expiry_date))
+        conn.execute("COMMIT")
+        return duration_days, expiry_date
+
+def _insert_keys(db: Database, duration: int, amount: int):
+    """Generate and store license keys. Returns the generated keys."""
+    keys = [generate_key() for _ in range(amount)]
+    with db.acquire() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(SQL_INSERT_KEY, [(key, duration) for key in keys])
+        conn.execute("COMMIT")
+    return keys
+
+def _insert_script(db: Database, name: str, script_key: str, url: str):
+    """Store a new script. Returns False if the key already exists."""
+    with db.acquire() as conn:
+        # INSERT OR IGNORE + rowcount instead of catching IntegrityError -
+        # no exception machinery on the duplicate branch
+        return conn.execute(SQL_INSERT_SCRIPT, (name, script_key, url)).rowcount == 1
+
+def _get_meta(db: Database, key: str):
+    with db.acquire() as conn:
+        row = conn.execute(SQL_SELECT_META, (key,)).fetchone()
+        return row[0] if row else None
+
+def _set_meta(db: Database, key: str, value: str):
+    with db.acquire() as conn:
+        conn.execute(SQL_UPSERT_META, (key, value))
+
+def _fetch_stats(db: Database):
+    # One statement instead of three COUNT round-trips
+    with db.acquire() as conn:
+        return conn.execute(SQL_SELECT_STATS).fetchone()
+
+@lru_cache(maxsize=64)
+def _render_script_field(name, desc, url, key, version):
+    """Rendered (field name, field value) pair for one script.
+
+    Scripts rarely change and the loadstring snippet is pure string work, so
+    memoize on the full row - any edit produces a new cache key, no manual
+    invalidation needed.
+    """
+    api_url = Config.API_URL or "https://your-app.onrender.com"
+    return (
+        f"{name} (v{version})",
+        f"{desc}\n\n**Key:** `{key}`\n**Usage:**\n```lua\ngetgenv().scriptkey = \"{key}\"\nloadstring(game:HttpGet(\"{url or api_url + '/raw/' + key}\"))()\n```"
+    )
+
 # =============================================
 # PANEL VIEW
 # =============================================
@@ -224,10 +507,7 @@ class PanelView(discord.ui.View):
     @discord.ui.button(label="🔑 Redeem Key", style=discord.ButtonStyle.success)
     async def redeem_key_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not has_buyer_role(interaction):
-            await interaction.response.send_message(
-                "❌ You need the Buyer role to use this panel!",
-                ephemeral=True
-            )
+            await _reply_err(interaction, _ERR_NEED_BUYER_PANEL)
             return
         
         modal = RedeemKeyModal()
@@ -236,31 +516,18 @@ class PanelView(discord.ui.View):
     @discord.ui.button(label="📜 Get Script", style=discord.ButtonStyle.primary)
     async def get_script_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not has_buyer_role(interaction):
-            await interaction.response.send_message(
-                "❌ You need the Buyer role to use this panel!",
-                ephemeral=True
-            )
+            await _reply_err(interaction, _ERR_NEED_BUYER_PANEL)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE discord_id = ?", (str(interaction.user.id),))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if not user or not user[5]:
+        scripts = await asyncio.to_thread(_fetch_scripts_for, db, str(interaction.user.id))
+
+        if scripts is None:
             await interaction.response.send_message(
                 "❌ You don't have an active subscription! Redeem a key first.",
                 ephemeral=True
             )
             return
-        
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, description, script_url, script_key, version FROM scripts")
-        scripts = cursor.fetchall()
-        conn.close()
-        
+
         if not scripts:
             await interaction.response.send_message(
                 "📝 No scripts available yet.",
@@ -275,66 +542,33 @@ class PanelView(discord.ui.View):
         )
         
         for script in scripts:
-            name, desc, url, key, version = script
-            api_url = Config.API_URL or "https://your-app.onrender.com"
-            embed.add_field(
-                name=f"{name} (v{version})",
-                value=f"{desc}\n\n**Key:** `{key}`\n**Usage:**\n```lua\ngetgenv().scriptkey = \"{key}\"\nloadstring(game:HttpGet(\"{url or api_url + '/raw/' + key}\"))()\n```",
-                inline=False
-            )
+            field_name, field_value = _render_script_field(*script)
+            embed.add_field(name=field_name, value=field_value, inline=False)
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @discord.ui.button(label="🔄 Reset HWID", style=discord.ButtonStyle.secondary)
     async def reset_hwid_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not has_buyer_role(interaction):
+            await _reply_err(interaction, _ERR_NEED_BUYER)
+            return
+        
+        status, days_left = await asyncio.to_thread(_reset_hwid, db, str(interaction.user.id))
+
+        if status == 'no_hwid':
             await interaction.response.send_message(
-                "❌ You need the Buyer role!",
+                "❌ No HWID registered to reset.",
                 ephemeral=True
             )
             return
-        
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT hwid, last_reset FROM users WHERE discord_id = ?", (str(interaction.user.id),))
-        result = cursor.fetchone()
-        
-        if not result or not result[0]:
+
+        if status == 'cooldown':
             await interaction.response.send_message(
-                "❌ No HWID registered to reset.",
+                f"❌ You can reset your HWID again in {days_left} days.",
                 ephemeral=True
             )
-            conn.close()
             return
-        
-        hwid, last_reset = result
-        
-        if last_reset:
-            last_reset_date = datetime.fromisoformat(last_reset)
-            days_since = (datetime.now() - last_reset_date).days
-            
-            if days_since < Config.HWID_RESET_COOLDOWN_DAYS:
-                days_left = Config.HWID_RESET_COOLDOWN_DAYS - days_since
-                await interaction.response.send_message(
-                    f"❌ You can reset your HWID again in {days_left} days.",
-                    ephemeral=True
-                )
-                conn.close()
-                return
-        
-        cursor.execute(
-            "INSERT INTO hwid_resets (discord_id, old_hwid) VALUES (?, ?)",
-            (str(interaction.user.id), hwid)
-        )
-        
-        cursor.execute(
-            "UPDATE users SET hwid = NULL, last_reset = ? WHERE discord_id = ?",
-            (datetime.now().isoformat(), str(interaction.user.id))
-        )
-        
-        conn.commit()
-        conn.close()
-        
+
         log_activity(db, str(interaction.user.id), "HWID_RESET", "via panel")
         
         embed = discord.Embed(
@@ -348,18 +582,11 @@ class PanelView(discord.ui.View):
     @discord.ui.button(label="📊 Get Stats", style=discord.ButtonStyle.secondary)
     async def get_stats_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not has_buyer_role(interaction):
-            await interaction.response.send_message(
-                "❌ You need the Buyer role!",
-                ephemeral=True
-            )
+            await _reply_err(interaction, _ERR_NEED_BUYER)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE discord_id = ?", (str(interaction.user.id),))
-        user = cursor.fetchone()
-        conn.close()
-        
+        user = await asyncio.to_thread(_fetch_user, db, str(interaction.user.id))
+
         if not user:
             await interaction.response.send_message(
                 "❌ You are not registered. Redeem a key first!",
@@ -410,59 +637,29 @@ class RedeemKeyModal(discord.ui.Modal, title="Redeem License Key"):
     
     async def on_submit(self, interaction: discord.Interaction):
         key_code = self.key_input.value.upper().strip()
-        
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT duration_days FROM keys WHERE key_code = ? AND is_redeemed = 0",
-            (key_code,)
+
+        redeemed = await asyncio.to_thread(
+            _redeem_key, db, str(interaction.user.id), interaction.user.name, key_code
         )
-        key_data = cursor.fetchone()
-        
-        if not key_data:
+
+        if not redeemed:
             await interaction.response.send_message(
                 "❌ Invalid or already redeemed key!",
                 ephemeral=True
             )
-            conn.close()
             return
-        
-        duration_days = key_data[0]
-        expiry_date = (datetime.now() + timedelta(days=duration_days)).isoformat()
-        
-        cursor.execute("SELECT id FROM users WHERE discord_id = ?", (str(interaction.user.id),))
-        user_exists = cursor.fetchone()
-        
-        if user_exists:
-            cursor.execute(
-                "UPDATE users SET license_key = ?, expiry_date = ?, is_active = 1 WHERE discord_id = ?",
-                (key_code, expiry_date, str(interaction.user.id))
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO users (discord_id, username, license_key, expiry_date, is_active) VALUES (?, ?, ?, ?, 1)",
-                (str(interaction.user.id), interaction.user.name, key_code, expiry_date)
-            )
-        
-        cursor.execute(
-            "UPDATE keys SET is_redeemed = 1, redeemed_by = ?, redeemed_at = ? WHERE key_code = ?",
-            (str(interaction.user.id), datetime.now().isoformat(), key_code)
-        )
-        
-        conn.commit()
-        conn.close()
-        
+
+        duration_days, expiry_date = redeemed
+
         log_activity(db, str(interaction.user.id), "REDEEM_KEY", f"Key: {key_code}")
         
         if Config.BUYER_ROLE_ID:
-            try:
-                role = interaction.guild.get_role(Config.BUYER_ROLE_ID)
-                if role and role not in interaction.user.roles:
-                    await interaction.user.add_roles(role)
-            except:
-                pass
-        
+            role = get_buyer_role(interaction.guild)
+            if role and role not in interaction.user.roles:
+                # Fire-and-forget: the role-add REST call can take hundreds
+                # of ms and the confirmation embed doesn't depend on it
+                asyncio.create_task(_safe_add_roles(interaction.user, role))
+
         embed = discord.Embed(
             title="🎉 Key Redeemed Successfully",
             color=0x00ff00
@@ -480,23 +677,91 @@ class RedeemKeyModal(discord.ui.Modal, title="Redeem License Key"):
 # =============================================
 # SLASH COMMANDS
 # =============================================
+# Cap how many command handlers run at once: a burst of slash commands would
+# otherwise pile dozens of coroutines onto the DB pool and Discord REST at
+# the same time. The wrapper defers *before* waiting for a slot, so queued
+# interactions are already ACKed and can't trip the 3-second window.
+_HANDLER_SEM = asyncio.Semaphore(4)
+
+def bounded(ephemeral=False):
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+            await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            async with _HANDLER_SEM:
+                return await fn(interaction, *args, **kwargs)
+        return wrapper
+    return decorator
+
+_activity_flush_task = None
+
+def _commands_fingerprint():
+    """Stable digest of the local command definitions, so sync only runs
+    when a command actually changed - not on every gateway reconnect."""
+    payload = json.dumps(
+        [
+            (cmd.name, cmd.description, [(p.name, str(p.type), p.required) for p in cmd.parameters])
+            for cmd in bot.tree.get_commands(guild=_GUILD_OBJ)
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def setup_hook():
+    # Runs once per process, before the gateway connects - unlike on_ready,
+    # which fires again on every reconnect
+    fingerprint = _commands_fingerprint()
+    last_synced = await asyncio.to_thread(_get_meta, db, 'commands_fingerprint')
+
+    if last_synced == fingerprint:
+        print("✅ Commands unchanged, skipping sync")
+        return
+
+    try:
+        synced = await bot.tree.sync(guild=_GUILD_OBJ)
+        await asyncio.to_thread(_set_meta, db, 'commands_fingerprint', fingerprint)
+        print(f"✅ Synced {len(synced)} command(s)")
+    except Exception as e:
+        print(f"❌ Failed to sync commands: {e}")
+
+bot.setup_hook = setup_hook
+
 @bot.event
 async def on_ready():
+    global _activity_flush_task
+
     print("=" * 50)
     print(f"✅ Bot logged in as {bot.user}")
     print(f"✅ Connected to {len(bot.guilds)} guild(s)")
     print("=" * 50)
-    
-    try:
-        synced = await bot.tree.sync(guild=discord.Object(id=Config.GUILD_ID))
-        print(f"✅ Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(f"❌ Failed to sync commands: {e}")
+
+    if _activity_flush_task is None:
+        _activity_flush_task = asyncio.create_task(_flush_activity_loop())
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    if after.id == Config.BUYER_ROLE_ID:
+        _ROLE_CACHE[after.guild.id] = after
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    if role.id == Config.BUYER_ROLE_ID:
+        _ROLE_CACHE.pop(role.guild.id, None)
+
+# Everything but the "Sent by" line is static, so build the panel embed once
+# at import and copy it per command instead of re-rendering the description
+_PANEL_EMBED_TEMPLATE = discord.Embed(
+    title=Config.PANEL_TITLE,
+    description=f"This control panel is for the project: **{Config.PANEL_TITLE}**\n\n"
+                f"If you're a buyer, click on the buttons below to redeem your key, get the script or get your role\n\n",
+    color=Config.PANEL_COLOR
+)
+_PANEL_TS_FMT = '%d/%m/%Y, %H:%M'
 
 @bot.tree.command(
     name="panel",
     description="Open the control panel",
-    guild=discord.Object(id=Config.GUILD_ID)
+    guild=_GUILD_OBJ
 )
 async def panel_command(interaction: discord.Interaction):
     if not has_buyer_role(interaction):
@@ -505,52 +770,38 @@ async def panel_command(interaction: discord.Interaction):
             ephemeral=True
         )
         return
-    
-    embed = discord.Embed(
-        title=Config.PANEL_TITLE,
-        description=f"This control panel is for the project: **{Config.PANEL_TITLE}**\n\n"
-                    f"If you're a buyer, click on the buttons below to redeem your key, get the script or get your role\n\n"
-                    f"**Sent by {interaction.user.mention}** • {datetime.now().strftime('%d/%m/%Y, %H:%M')}",
-        color=Config.PANEL_COLOR
-    )
-    
+
+    # Copy the prebuilt skeleton and append only the dynamic footer line
+    embed = _PANEL_EMBED_TEMPLATE.copy()
+    embed.description += f"**Sent by {interaction.user.mention}** • {datetime.now().strftime(_PANEL_TS_FMT)}"
+
     view = PanelView(str(interaction.user.id))
-    
+
     await interaction.response.send_message(embed=embed, view=view)
 
 @bot.tree.command(
     name="whitelist",
     description="Whitelist a user and give them the Buyer role",
-    guild=discord.Object(id=Config.GUILD_ID)
+    guild=_GUILD_OBJ
 )
 @app_commands.describe(user="The user to whitelist")
+@bounded()
 async def whitelist_command(interaction: discord.Interaction, user: discord.Member):
     if not is_admin(interaction):
-        await interaction.response.send_message(
-            "❌ You don't have permission to use this command!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, _ERR_NO_PERMISSION)
         return
     
     if Config.BUYER_ROLE_ID == 0:
-        await interaction.response.send_message(
-            "❌ BUYER_ROLE_ID not configured in environment variables!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, "❌ BUYER_ROLE_ID not configured in environment variables!")
         return
     
-    role = interaction.guild.get_role(Config.BUYER_ROLE_ID)
+    role = get_buyer_role(interaction.guild)
     
     if not role:
-        await interaction.response.send_message(
-            "❌ Buyer role not found!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, "❌ Buyer role not found!")
         return
     
     try:
-        await user.add_roles(role)
-        
         log_activity(db, str(interaction.user.id), "WHITELIST_USER", f"Whitelisted: {user.name}")
         
         embed = discord.Embed(
@@ -561,60 +812,45 @@ async def whitelist_command(interaction: discord.Interaction, user: discord.Memb
         embed.add_field(name="User", value=user.mention, inline=True)
         embed.add_field(name="By", value=interaction.user.mention, inline=True)
         
-        await interaction.response.send_message(embed=embed)
-        
-        try:
-            dm_embed = discord.Embed(
-                title="🎉 You've been whitelisted!",
-                description=f"You've been given access to **{Config.PANEL_TITLE}**!\n\nUse `/panel` in the server.",
-                color=Config.PANEL_COLOR
-            )
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        # The role add and the reply don't depend on each other - run them
+        # concurrently so the wall-clock cost is max(), not sum()
+        await asyncio.gather(
+            user.add_roles(role),
+            interaction.followup.send(embed=embed),
+        )
+
+        dm_embed = discord.Embed(
+            title="🎉 You've been whitelisted!",
+            description=f"You've been given access to **{Config.PANEL_TITLE}**!\n\nUse `/panel` in the server.",
+            color=Config.PANEL_COLOR
+        )
+        # Fire-and-forget: the DM (often 100-500ms, and may be Forbidden)
+        # shouldn't hold the interaction open
+        asyncio.create_task(_safe_dm(user, dm_embed))
         
     except Exception as e:
-        await interaction.response.send_message(
-            f"❌ Error: {e}",
-            ephemeral=True
-        )
+        await interaction.followup.send(f"❌ Error: {e}")
 
 @bot.tree.command(
     name="genkey",
     description="Generate license keys [ADMIN]",
-    guild=discord.Object(id=Config.GUILD_ID)
+    guild=_GUILD_OBJ
 )
 @app_commands.describe(duration="Duration in days", amount="Number of keys")
+@bounded(ephemeral=True)
 async def genkey_command(interaction: discord.Interaction, duration: int = 30, amount: int = 1):
     if not is_admin(interaction):
-        await interaction.response.send_message(
-            "❌ Admin only!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, _ERR_NOT_ADMIN)
         return
     
     if amount > 20:
-        await interaction.response.send_message(
-            "❌ Max 20 keys!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, "❌ Max 20 keys!")
         return
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    keys = []
-    for _ in range(amount):
-        key = generate_key()
-        cursor.execute(
-            "INSERT INTO keys (key_code, duration_days) VALUES (?, ?)",
-            (key, duration)
-        )
-        keys.append(key)
-    
-    conn.commit()
-    conn.close()
-    
+    # Generate everything up front, then insert as one prepared-statement
+    # batch inside a single transaction - one fsync for the whole run
+    keys = await asyncio.to_thread(_insert_keys, db, duration, amount)
+
     log_activity(db, str(interaction.user.id), "GEN_KEYS", f"{amount}x{duration}d")
     
     embed = discord.Embed(
@@ -623,77 +859,52 @@ async def genkey_command(interaction: discord.Interaction, duration: int = 30, a
         color=0x00ff00
     )
     
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(
     name="genscript",
     description="Generate script key [ADMIN]",
-    guild=discord.Object(id=Config.GUILD_ID)
+    guild=_GUILD_OBJ
 )
 @app_commands.describe(name="Script name", url="Script URL (optional)")
+@bounded(ephemeral=True)
 async def genscript_command(interaction: discord.Interaction, name: str, url: str = ""):
     if not is_admin(interaction):
-        await interaction.response.send_message(
-            "❌ Admin only!",
-            ephemeral=True
-        )
+        await _reply_err(interaction, _ERR_NOT_ADMIN)
         return
     
     script_key = generate_key()
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
+    created = await asyncio.to_thread(_insert_script, db, name, script_key, url)
+
+    if not created:
+        await interaction.followup.send("❌ Script already exists!", ephemeral=True)
+        return
+
+    log_activity(db, str(interaction.user.id), "GEN_SCRIPT", f"{name}")
     
-    try:
-        cursor.execute(
-            "INSERT INTO scripts (name, script_key, script_url) VALUES (?, ?, ?)",
-            (name, script_key, url)
-        )
-        conn.commit()
-        
-        log_activity(db, str(interaction.user.id), "GEN_SCRIPT", f"{name}")
-        
-        api_url = Config.API_URL or "https://your-app.onrender.com"
-        
-        embed = discord.Embed(
-            title="📜 Script Key Generated",
-            color=0x00ff00
-        )
-        embed.add_field(name="Name", value=name, inline=True)
-        embed.add_field(name="Key", value=f"`{script_key}`", inline=False)
-        embed.add_field(name="URL", value=url or f"{api_url}/raw/{script_key}", inline=False)
-        embed.set_footer(text="⚠️ Hardcode this key into your Lua script!")
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        
-    except sqlite3.IntegrityError:
-        await interaction.response.send_message(
-            "❌ Script already exists!",
-            ephemeral=True
-        )
-    finally:
-        conn.close()
+    api_url = Config.API_URL or "https://your-app.onrender.com"
+    
+    embed = discord.Embed(
+        title="📜 Script Key Generated",
+        color=0x00ff00
+    )
+    embed.add_field(name="Name", value=name, inline=True)
+    embed.add_field(name="Key", value=f"`{script_key}`", inline=False)
+    embed.add_field(name="URL", value=url or f"{api_url}/raw/{script_key}", inline=False)
+    embed.set_footer(text="⚠️ Hardcode this key into your Lua script!")
+    
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(
     name="stats",
     description="View system statistics",
-    guild=discord.Object(id=Config.GUILD_ID)
+    guild=_GUILD_OBJ
 )
+@bounded()
 async def stats_command(interaction: discord.Interaction):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-    active = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM blacklist")
-    blacklisted = cursor.fetchone()[0]
-    
-    conn.close()
-    
+    total, active, blacklisted = await asyncio.to_thread(_fetch_stats, db)
+
     embed = discord.Embed(
         title="📊 Statistics",
         color=Config.PANEL_COLOR
@@ -702,7 +913,7 @@ async def stats_command(interaction: discord.Interaction):
     embed.add_field(name="Active", value=str(active), inline=True)
     embed.add_field(name="Blacklisted", value=str(blacklisted), inline=True)
     
-    await interaction.response.send_message(embed=embed)
+    await interaction.followup.send(embed=embed)
 
 # =============================================
 # RUN BOT
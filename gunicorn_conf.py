@@ -0,0 +1,17 @@
+"""
+Gunicorn configuration for the API server
+
+All handlers are I/O-bound (SQLite + outbound Discord webhook), so gevent
+workers let slow requests overlap instead of serializing behind one thread.
+
+Run with: gunicorn -c gunicorn_conf.py api_server:app
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_connections = 1000
+timeout = 30